@@ -1,7 +1,8 @@
 import logging
 from flask_login import LoginManager, UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from db import db_read, db_write
+from db import db_read, db_write, QueryTimeout
+from cache import cache
 
 # Logger für dieses Modul
 logger = logging.getLogger(__name__)
@@ -18,18 +19,27 @@ class User(UserMixin):
     @staticmethod
     def get_by_id(user_id):
         logger.debug("User.get_by_id() aufgerufen mit user_id=%s", user_id)
+        # Wird bei jedem Request (load_user) gebraucht -> Cache, ohne Passwort-Hash
+        cached = cache.get(f"user:{user_id}")
+        if cached:
+            return User(cached["id"], cached["username"], None)
         try:
             row = db_read(
                 "SELECT * FROM users WHERE id = %s",
                 (user_id,),
-                single=True
+                single=True,
+                prepared=True
             )
             logger.debug("User.get_by_id() DB-Ergebnis: %r", row)
+        except QueryTimeout:
+            # Deadline überschritten: nicht als "kein User" behandeln (-> 503)
+            raise
         except Exception:
             logger.exception("Fehler bei User.get_by_id(%s)", user_id)
             return None
 
         if row:
+            cache.set(f"user:{user_id}", {"id": row["id"], "username": row["username"]})
             return User(row["id"], row["username"], row["password"])
         else:
             logger.warning("User.get_by_id(): kein User mit id=%s gefunden", user_id)
@@ -42,9 +52,12 @@ class User(UserMixin):
             row = db_read(
                 "SELECT * FROM users WHERE username = %s",
                 (username,),
-                single=True
+                single=True,
+                prepared=True
             )
             logger.debug("User.get_by_username() DB-Ergebnis: %r", row)
+        except QueryTimeout:
+            raise
         except Exception:
             logger.exception("Fehler bei User.get_by_username(%s)", username)
             return None
@@ -87,7 +100,8 @@ def register_user(username, password):
     try:
         db_write(
             "INSERT INTO users (username, password) VALUES (%s, %s)",
-            (username, hashed)
+            (username, hashed),
+            prepared=True
         )
         logger.info("register_user(): User '%s' erfolgreich angelegt", username)
     except Exception:
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import random
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+# Logger für dieses Modul
+logger = logging.getLogger(__name__)
+
+# Small key/value cache for users, dashboard stats and club pages.
+#
+# CACHE_BACKEND=memory (default): per-process LRU dict. With several workers
+#   every worker has its own copy and its own misses.
+# CACHE_BACKEND=sqlite: one local SQLite file (CACHE_PATH) shared by all
+#   worker processes on the machine, so entries and invalidations are seen by
+#   every worker and memory does not grow with the worker count.
+# CACHE_BACKEND=none: caching disabled.
+#
+# Values must be JSON-serializable. Writes to the base tables call delete()
+# for the affected keys; the TTL bounds staleness for anything missed.
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(os.path.dirname(__file__), "cache.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+DEFAULT_TTL = int(os.getenv("CACHE_TTL", "60"))
+
+
+class MemoryCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        # A forked child must not share the parent's lock state
+        os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SqliteCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread and per process; never reuse one across fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._conn().execute(
+                "SELECT value, expires FROM cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning("cache get(%s) failed: %s", key, e)
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value, default=str), time.time() + ttl)
+            )
+            if random.random() < 0.01:
+                # Occasionally drop expired entries so the file does not grow forever
+                conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("cache set(%s) failed: %s", key, e)
+
+    def delete(self, *keys):
+        if not keys:
+            return
+        try:
+            conn = self._conn()
+            conn.execute(f"DELETE FROM cache WHERE key IN ({', '.join(['?'] * len(keys))})", keys)
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning("cache delete(%s) failed: %s", keys, e)
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache")
+        conn.commit()
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+
+def _create_cache():
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SqliteCache()
+        except Exception as e:
+            logger.warning("SQLite cache setup failed, falling back to memory: %s", e)
+    elif CACHE_BACKEND == "none":
+        return NullCache()
+    return MemoryCache()
+
+
+cache = _create_cache()
@@ -0,0 +1,35 @@
+import logging
+from db import db_read
+
+# Logger für dieses Modul
+logger = logging.getLogger(__name__)
+
+# Read side of the change data capture in db.py: triggers on the tracked
+# tables append (seq, table_name, op, row_id) to change_log for every row
+# written, in the writing transaction. Consumers remember the last seq they
+# processed and ask for everything after it, so a sync costs O(changes)
+# instead of a full export.
+#
+# seq is assigned in commit order: on MySQL every write holds the
+# change_log_lock row until it commits; SQLite allows one writer at a time and
+# the trigger's insert is part of that writer's transaction. So a consumer can
+# safely continue from the last seq it has seen.
+
+DEFAULT_BATCH = 500
+MAX_BATCH = 5000
+
+
+def changes_since(since=0, limit=DEFAULT_BATCH):
+    """Return up to `limit` change_log rows with seq > since, oldest first."""
+    limit = max(1, min(int(limit), MAX_BATCH))
+    rows = db_read(
+        f"SELECT seq, table_name, op, row_id, created_at FROM change_log WHERE seq > %s ORDER BY seq ASC LIMIT {limit}",
+        (int(since),)
+    )
+    logger.debug("changes_since(%s, %s) -> %d Einträge", since, limit, len(rows))
+    return rows
+
+
+def last_seq():
+    row = db_read("SELECT MAX(seq) as s FROM change_log", single=True)
+    return (row or {}).get("s") or 0
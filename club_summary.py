@@ -0,0 +1,104 @@
+import logging
+from db import db_read, db_write
+
+# Logger für dieses Modul
+logger = logging.getLogger(__name__)
+
+# The club list used to show only the country because everything else
+# (squad size, titles, coach) needed extra joins per club. `club_summary`
+# holds one precomputed row per club instead. After writing to the base
+# tables the add routes call `club_changed()`, which recomputes that club's
+# row from scratch. The refresh is idempotent, so if one fails (it runs after
+# the base insert has committed) the next write to the club repairs the row;
+# `ensure_club_summary()` additionally repairs drifted rows at startup and
+# `rebuild_club_summary()` recomputes the whole table.
+
+# Expected summary values per club, computed from the base tables
+_EXPECTED_SELECT = """
+    SELECT
+        c.id AS club_id,
+        COALESCE(c.club_name, c.name) AS club_name,
+        c.country AS country,
+        (SELECT COUNT(*) FROM players_by_club pc WHERE pc.club_id = c.id) AS player_count,
+        (SELECT COUNT(*) FROM titles_per_club tp WHERE tp.club_id = c.id) AS title_count,
+        (SELECT MAX(tp.year_) FROM titles_per_club tp WHERE tp.club_id = c.id) AS last_title_year,
+        (SELECT co.coach_firstname FROM coaches co JOIN coaches_per_club cc ON co.id = cc.coach_id
+            WHERE cc.club_id = c.id AND cc.end_year IS NULL ORDER BY cc.start_year DESC, cc.id DESC LIMIT 1) AS coach_firstname,
+        (SELECT co.coach_name FROM coaches co JOIN coaches_per_club cc ON co.id = cc.coach_id
+            WHERE cc.club_id = c.id AND cc.end_year IS NULL ORDER BY cc.start_year DESC, cc.id DESC LIMIT 1) AS coach_name
+    FROM clubs c
+"""
+
+_COLUMNS = "(club_id, club_name, country, player_count, title_count, last_title_year, coach_firstname, coach_name)"
+_INSERT_SQL = "INSERT INTO club_summary " + _COLUMNS + _EXPECTED_SELECT
+# Single statement, so the club never disappears from the list while refreshing
+_REPLACE_SQL = "REPLACE INTO club_summary " + _COLUMNS + _EXPECTED_SELECT + " WHERE c.id = %s"
+
+# Clubs whose summary row is missing or differs from the base tables
+_DRIFT_SQL = """
+    SELECT e.club_id
+    FROM (""" + _EXPECTED_SELECT + """) e
+    LEFT JOIN club_summary s ON s.club_id = e.club_id
+    WHERE s.club_id IS NULL
+        OR s.player_count <> e.player_count
+        OR s.title_count <> e.title_count
+        OR COALESCE(s.last_title_year, -1) <> COALESCE(e.last_title_year, -1)
+        OR COALESCE(s.club_name, '') <> COALESCE(e.club_name, '')
+        OR COALESCE(s.country, '') <> COALESCE(e.country, '')
+        OR COALESCE(s.coach_firstname, '') <> COALESCE(e.coach_firstname, '')
+        OR COALESCE(s.coach_name, '') <> COALESCE(e.coach_name, '')
+"""
+
+# Summary rows of clubs that no longer exist
+_ORPHAN_SQL = """
+    SELECT s.club_id
+    FROM club_summary s
+    LEFT JOIN clubs c ON c.id = s.club_id
+    WHERE c.id IS NULL
+"""
+
+# Above this many drifted rows one full rebuild is cheaper than per-club refreshes
+FULL_REBUILD_THRESHOLD = 100
+
+
+def rebuild_club_summary():
+    """Recompute the whole club_summary table from the base tables."""
+    logger.info("rebuild_club_summary(): baue club_summary neu auf")
+    db_write("DELETE FROM club_summary")
+    db_write(_INSERT_SQL)
+
+
+def refresh_club_summary(club_id):
+    """Recompute the summary row of a single club."""
+    db_write(_REPLACE_SQL, (club_id,))
+
+
+def ensure_club_summary():
+    """Repair club_summary rows that drifted from the base tables (e.g. lost incremental updates)."""
+    drifted = [r.get("club_id") for r in db_read(_DRIFT_SQL)]
+    orphans = [r.get("club_id") for r in db_read(_ORPHAN_SQL)]
+    if not drifted and not orphans:
+        return
+    logger.warning(
+        "ensure_club_summary(): %d Clubs nicht synchron, %d verwaiste Zeilen", len(drifted), len(orphans)
+    )
+    if len(drifted) + len(orphans) > FULL_REBUILD_THRESHOLD:
+        rebuild_club_summary()
+        return
+    for club_id in orphans:
+        db_write("DELETE FROM club_summary WHERE club_id = %s", (club_id,))
+    for club_id in drifted:
+        refresh_club_summary(club_id)
+
+
+# === CALLED BY THE ADD ROUTES ===
+def club_changed(club_id):
+    """Refresh a club's summary row after a write; logs instead of raising.
+
+    The base rows are already committed at this point, so a failed refresh
+    must not make the write look failed to the user.
+    """
+    try:
+        refresh_club_summary(club_id)
+    except Exception as e:
+        logger.error("club_changed(%s): club_summary nicht aktualisiert: %s", club_id, e)
@@ -1,6 +1,12 @@
 from dotenv import load_dotenv
 import os
+import re
+import time
+import functools
 import logging
+import threading
+import contextvars
+from collections import OrderedDict
 
 # Load .env variables
 load_dotenv()
@@ -11,17 +17,215 @@ DB_CONFIG = {
     "database": os.getenv("DB_DATABASE")
 }
 
+# Per-request deadline: flask_app.py sets it for GET requests, db_read turns
+# it into a SQLite progress-handler abort / MySQL MAX_EXECUTION_TIME hint.
+# Search queries (db_read(..., capped=True)) are also limited to MAX_ROWS
+# rows. Reads that overrun raise QueryTimeout, which the app answers with
+# 503 "search too broad". Plain listings are never capped.
+QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "2.0"))
+MAX_ROWS = int(os.getenv("DB_MAX_ROWS", "5000"))
+# The MySQL hint is always the full QUERY_TIMEOUT, so each query has a single
+# hinted SQL text (one prepared statement); the remaining request budget is
+# checked by _time_left() before every read
+HINT_MS = max(1, int(QUERY_TIMEOUT * 1000))
+
+_deadline = contextvars.ContextVar("db_deadline", default=None)
+
+METRICS = {"query_timeouts": 0, "row_cap_hits": 0, "prepared_hits": 0, "prepared_misses": 0}
+_metrics_lock = threading.Lock()
+
+# Statement caches: translated SQL text (%s -> ?, INSERT IGNORE dialects) is
+# memoized per original string, SQLite keeps compiled statements per
+# connection, MySQL keeps server-side prepared statements per connection for
+# calls made with prepared=True.
+SQL_CACHE_SIZE = int(os.getenv("DB_SQL_CACHE_SIZE", "512"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("DB_SQLITE_STATEMENT_CACHE", "256"))
+PREPARED_CACHE_SIZE = int(os.getenv("DB_PREPARED_CACHE_SIZE", "64"))
+
+
+class QueryTimeout(Exception):
+    """A read exceeded the request deadline or the row cap."""
+
+
+def _count(metric):
+    with _metrics_lock:
+        METRICS[metric] += 1
+
+
+def set_deadline(seconds):
+    """Start a deadline `seconds` from now for this request/thread (None clears it)."""
+    _deadline.set(time.monotonic() + seconds if seconds else None)
+
+
+def _time_left():
+    """Seconds until the deadline, None without one; raises once it has passed."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        _count("query_timeouts")
+        raise QueryTimeout("request deadline exceeded")
+    return left
+
+
+# Per-request time spent in db_read/db_write, used by profiling.py
+_db_timer = contextvars.ContextVar("db_timer", default=None)
+
+
+def db_timer_start():
+    _db_timer.set([0.0])
+
+
+def db_timer_stop():
+    """Return the seconds spent in the db since db_timer_start() and stop timing."""
+    timer = _db_timer.get()
+    _db_timer.set(None)
+    return timer[0] if timer else 0.0
+
+
+def _timed(fn):
+    def wrapper(*args, **kwargs):
+        timer = _db_timer.get()
+        if timer is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            timer[0] += time.perf_counter() - start
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+@functools.lru_cache(maxsize=SQL_CACHE_SIZE)
+def _cap_sql(sql, max_rows):
+    # Let the database stop after MAX_ROWS + 1 rows instead of fetching everything
+    if re.search(r"\bLIMIT\s+\d+\s*$", sql, re.IGNORECASE):
+        return sql
+    return f"{sql.rstrip()} LIMIT {max_rows + 1}"
+
+
+def _check_row_cap(rows):
+    if len(rows) > MAX_ROWS:
+        _count("row_cap_hits")
+        raise QueryTimeout(f"query returned more than {MAX_ROWS} rows")
+    return rows
+
+
+# Change data capture: AFTER INSERT/UPDATE/DELETE triggers on these tables
+# append (table_name, op, row_id) to `change_log`. Triggers run inside the
+# writing statement's transaction and fire once per row, so the log always
+# matches what was actually written (see change_log.py). Derived tables like
+# club_summary and users (password hashes) are deliberately not logged.
+CHANGE_LOG_TABLES = {
+    "clubs", "players", "coaches", "titles",
+    "players_by_club", "coaches_per_club", "titles_per_club",
+}
+# Columns computed from other columns; updates touching only these are not logged
+DERIVED_COLUMNS = {"search_key"}
+
+
+def _change_log_triggers(table, columns, mysql):
+    """Yield (name, CREATE TRIGGER sql, body) for the change_log triggers of one table."""
+    def log(op, row):
+        return f"INSERT INTO change_log (table_name, op, row_id) VALUES ('{table}', '{op}', {row}.id)"
+
+    eq = "<=>" if mysql else "IS"
+    same = " AND ".join(f"NEW.{c} {eq} OLD.{c}" for c in columns if c not in DERIVED_COLUMNS)
+    if mysql:
+        # Single statements, so no BEGIN ... END / DELIMITER is needed
+        bodies = {
+            "insert": log("insert", "NEW"),
+            "update": f"INSERT INTO change_log (table_name, op, row_id) SELECT '{table}', 'update', NEW.id FROM DUAL WHERE NOT ({same})",
+            "delete": log("delete", "OLD"),
+        }
+    else:
+        bodies = {
+            "insert": f"BEGIN {log('insert', 'NEW')}; END",
+            "update": f"WHEN NOT ({same}) BEGIN {log('update', 'NEW')}; END",
+            "delete": f"BEGIN {log('delete', 'OLD')}; END",
+        }
+    for op, body in bodies.items():
+        name = f"change_log_{table}_{op}"
+        yield name, f"CREATE TRIGGER {name} AFTER {op.upper()} ON {table} FOR EACH ROW {body}", body
+
+
+def _sync_change_log_triggers(cur, columns, stored, mysql):
+    """Create missing change_log triggers and replace outdated ones.
+
+    `columns(table)` returns the table's column names (empty if it does not
+    exist), `stored(name)` the stored definition of a trigger or None. The
+    UPDATE trigger lists the table's columns, so adding a column changes it.
+    """
+    for table in sorted(CHANGE_LOG_TABLES):
+        cols = columns(table)
+        if not cols:
+            continue
+        for name, create_sql, body in _change_log_triggers(table, cols, mysql):
+            current = stored(name)
+            if current is not None and " ".join(body.split()) in " ".join(current.split()):
+                continue
+            if current is not None:
+                cur.execute(f"DROP TRIGGER {name}")
+            cur.execute(create_sql)
+            logging.info("Created change_log trigger %s", name)
+
+
 # Try to use MySQL if DB_HOST is set; on failure fall back to SQLite
 USE_SQLITE = True
 if DB_CONFIG.get("host"):
     try:
+        import mysql.connector
         from mysql.connector import pooling
 
-        pool = pooling.MySQLConnectionPool(pool_name="pool", pool_size=5, **DB_CONFIG)
+        POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+
+        # Pooled connections must never be shared between processes: a
+        # preforking server (gunicorn) would otherwise have all workers talk
+        # over the sockets the master opened. The pool is created lazily by
+        # get_conn(), remembers the pid it was created in, and a forked child
+        # builds its own.
+        _pool_lock = threading.Lock()
+
+        def _create_pool():
+            global pool, _pool_pid
+            # pool_reset_session=False keeps prepared statements (see _prepared_cursor).
+            # autocommit=True so a read never leaves an open transaction (and its
+            # REPEATABLE READ snapshot) on a pooled connection; db_write starts
+            # an explicit transaction instead.
+            pool = pooling.MySQLConnectionPool(
+                pool_name=f"pool_{os.getpid()}", pool_size=POOL_SIZE, pool_reset_session=False,
+                autocommit=True, **DB_CONFIG
+            )
+            _pool_pid = os.getpid()
+            return pool
+
+        # Pools inherited from the parent. The child must neither use nor
+        # garbage-collect them: collecting a connection shuts down its socket
+        # (MySQLSocket.__del__ / mysql_close in the C extension), and that
+        # socket is shared with the parent. Keeping a reference avoids it.
+        _inherited_pools = []
+
+        def _reset_pool_after_fork():
+            global pool, _pool_pid, _pool_lock
+            if pool is not None:
+                _inherited_pools.append(pool)
+            pool = None
+            _pool_pid = None
+            _pool_lock = threading.Lock()
 
-        # Attempt to migrate schema (add uuid, country, stadium) for MySQL
+        pool = None
+        _pool_pid = None
+        os.register_at_fork(after_in_child=_reset_pool_after_fork)
+
+        # Attempt to migrate schema (add uuid, country, stadium) for MySQL.
+        # Uses a one-off connection, so importing db.py opens no pool (a
+        # preloading gunicorn master never serves requests). A failing
+        # connect falls back to SQLite below.
+        conn = mysql.connector.connect(**DB_CONFIG)
         try:
-            conn = pool.get_connection()
             cur = conn.cursor()
             
             # 1. uuid
@@ -48,14 +252,129 @@ if DB_CONFIG.get("host"):
             except Exception as e:
                 logging.debug("MySQL alter table (stadium) skipped: %s", e)
 
+            # 4. club_summary (materialized club list, see club_summary.py)
+            try:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS club_summary (
+                        club_id INT PRIMARY KEY,
+                        club_name VARCHAR(250),
+                        country VARCHAR(250),
+                        player_count INT NOT NULL DEFAULT 0,
+                        title_count INT NOT NULL DEFAULT 0,
+                        last_title_year INT,
+                        coach_firstname VARCHAR(250),
+                        coach_name VARCHAR(250),
+                        INDEX idx_club_summary_name (club_name)
+                    )
+                    """
+                )
+                conn.commit()
+            except Exception as e:
+                logging.debug("MySQL create table (club_summary) skipped: %s", e)
+
+            # 5. change_log (append-only change data capture, see change_log.py)
+            try:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS change_log (
+                        seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+                        table_name VARCHAR(64) NOT NULL,
+                        op VARCHAR(10) NOT NULL,
+                        row_id INT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                    """
+                )
+                conn.commit()
+            except Exception as e:
+                logging.debug("MySQL create table (change_log) skipped: %s", e)
+            try:
+                # Single row locked by every tracked write (see _CHANGE_LOCK_SQL)
+                cur.execute("CREATE TABLE IF NOT EXISTS change_log_lock (id INT PRIMARY KEY)")
+                cur.execute("INSERT IGNORE INTO change_log_lock (id) VALUES (1)")
+                conn.commit()
+            except Exception as e:
+                logging.debug("MySQL create table (change_log_lock) skipped: %s", e)
+
+            # 6. search keys + trigram index (see search_index.py)
+            for table in ("players", "coaches"):
+                try:
+                    cur.execute(f"ALTER TABLE {table} ADD COLUMN search_key VARCHAR(500)")
+                    conn.commit()
+                    logging.info("Migrated MySQL: Added search_key column to %s", table)
+                except Exception as e:
+                    logging.debug("MySQL alter table (%s.search_key) skipped: %s", table, e)
+            try:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS name_trigrams (
+                        kind VARCHAR(10) NOT NULL,
+                        trigram VARCHAR(12) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+                        entity_id INT NOT NULL,
+                        PRIMARY KEY (kind, trigram, entity_id),
+                        INDEX idx_name_trigrams_entity (kind, entity_id)
+                    )
+                    """
+                )
+                conn.commit()
+            except Exception as e:
+                logging.debug("MySQL create table (name_trigrams) skipped: %s", e)
+            try:
+                cur.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS trigram_stats (
+                        kind VARCHAR(10) NOT NULL,
+                        trigram VARCHAR(12) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+                        postings INT NOT NULL DEFAULT 0,
+                        PRIMARY KEY (kind, trigram)
+                    )
+                    """
+                )
+                conn.commit()
+            except Exception as e:
+                logging.debug("MySQL create table (trigram_stats) skipped: %s", e)
+
+            # 7. change_log triggers (after all column migrations, see _change_log_triggers)
+            def _columns(table):
+                cur.execute(
+                    "SELECT COLUMN_NAME FROM information_schema.COLUMNS "
+                    "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+                    (table,)
+                )
+                return [r[0] for r in cur.fetchall()]
+
+            def _stored(name):
+                cur.execute(
+                    "SELECT ACTION_STATEMENT FROM information_schema.TRIGGERS "
+                    "WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = %s",
+                    (name,)
+                )
+                row = cur.fetchone()
+                return row[0] if row else None
+
+            try:
+                _sync_change_log_triggers(cur, _columns, _stored, mysql=True)
+                conn.commit()
+            except Exception as e:
+                # Without triggers /changes stays empty, so make this visible
+                logging.warning("MySQL change_log triggers could not be created: %s", e)
+
             cur.close()
-            conn.close()
         except Exception as e:
              logging.warning("MySQL migration check failed: %s", e)
+        finally:
+            conn.close()
 
         def get_conn():
+            if _pool_pid != os.getpid():
+                with _pool_lock:
+                    if _pool_pid != os.getpid():
+                        logging.info("Creating MySQL pool for process %s", os.getpid())
+                        _create_pool()
             return pool.get_connection()
 
+        @functools.lru_cache(maxsize=SQL_CACHE_SIZE)
         def _normalize_sql(sql: str) -> str:
             if not sql:
                 return sql
@@ -65,37 +384,160 @@ if DB_CONFIG.get("host"):
             else:
                 return sql.replace("INSERT OR IGNORE", "INSERT IGNORE")
 
+        _translate_sql = _normalize_sql
 
-        def db_read(sql, params=None, single=False):
-            sql = _normalize_sql(sql)
-            conn = get_conn()
-            try:
-                cur = conn.cursor(dictionary=True)
-                cur.execute(sql, params or ())
+        # Server-side prepared statements live on the MySQL session, so prepared
+        # cursors are kept per session (connection_id) and per SQL text, both as
+        # bounded LRUs. The pool is created with pool_reset_session=False so
+        # they survive the connection going back to the pool. The cursor keeps
+        # a reference to the physical connection, not to the pool wrapper.
+        _prepared = OrderedDict()
+        _prepared_lock = threading.Lock()
 
-                if single:
-                    row = cur.fetchone()
-                    logging.debug("db_read(single=True) -> %s", row)
-                    return row
+        def _session_stmts(conn):
+            session = conn.connection_id
+            with _prepared_lock:
+                stmts = _prepared.get(session)
+                if stmts is None:
+                    stmts = _prepared[session] = OrderedDict()
+                    # Sessions that went away (reconnects) are dropped eventually
+                    while len(_prepared) > POOL_SIZE * 2:
+                        _prepared.popitem(last=False)
                 else:
-                    rows = cur.fetchall()
-                    logging.debug("db_read(single=False) -> %s", rows)
-                    return rows
+                    _prepared.move_to_end(session)
+            return stmts
 
-            finally:
+        def _prepared_cursor(conn, sql):
+            stmts = _session_stmts(conn)
+            cur = stmts.get(sql)
+            if cur is not None:
+                stmts.move_to_end(sql)
+                _count("prepared_hits")
+                return cur
+            _count("prepared_misses")
+            cur = conn.cursor(prepared=True)
+            stmts[sql] = cur
+            while len(stmts) > PREPARED_CACHE_SIZE:
+                _, old = stmts.popitem(last=False)
+                try:
+                    old.close()
+                except:
+                    pass
+            return cur
+
+        def _drop_prepared(conn, sql):
+            cur = _session_stmts(conn).pop(sql, None)
+            if cur is not None:
                 try:
                     cur.close()
                 except:
                     pass
+
+        # MySQL error codes for "statement interrupted"
+        _TIMEOUT_ERRNOS = (3024, 1317)
+        # Unknown prepared statement handler (e.g. the server dropped it)
+        _STALE_STMT_ERRNOS = (1243,)
+
+        def _run_prepared(conn, sql, params):
+            pcur = _prepared_cursor(conn, sql)
+            try:
+                pcur.execute(sql, params or ())
+            except Exception as e:
+                _drop_prepared(conn, sql)
+                if getattr(e, "errno", None) not in _STALE_STMT_ERRNOS:
+                    raise
+                # Re-prepare once on a fresh cursor
+                pcur = _prepared_cursor(conn, sql)
+                pcur.execute(sql, params or ())
+            return pcur
+
+        @functools.lru_cache(maxsize=SQL_CACHE_SIZE)
+        @functools.lru_cache(maxsize=SQL_CACHE_SIZE)
+        def _hint_sql(sql):
+            # Per-statement server timeout without extra round trips (SELECT only).
+            # Cached so the same string object reaches the prepared cursor,
+            # which only re-prepares when it gets a different object.
+            return re.sub(r"^\s*SELECT\b", f"SELECT /*+ MAX_EXECUTION_TIME({HINT_MS}) */", sql, count=1, flags=re.IGNORECASE)
+
+        def db_read(sql, params=None, single=False, prepared=False, capped=False):
+            if capped:
+                sql = _cap_sql(sql, MAX_ROWS)
+            sql = _normalize_sql(sql)
+            left = _time_left()
+            if left is not None:
+                sql = _hint_sql(sql)
+            conn = get_conn()
+            try:
+                if prepared:
+                    pcur = _run_prepared(conn, sql, params)
+                    try:
+                        # Prepared cursors return tuples; fetch everything so the
+                        # cursor can be reused for the next execute
+                        rows = [dict(zip(pcur.column_names, r)) for r in pcur.fetchall()]
+                    except Exception:
+                        _drop_prepared(conn, sql)
+                        raise
+                    if single:
+                        row = rows[0] if rows else None
+                        logging.debug("db_read(single=True) -> %s", row)
+                        return row
+                else:
+                    cur = conn.cursor(dictionary=True)
+                    try:
+                        cur.execute(sql, params or ())
+                        if single:
+                            row = cur.fetchone()
+                            logging.debug("db_read(single=True) -> %s", row)
+                            return row
+                        rows = cur.fetchall()
+                    finally:
+                        try:
+                            cur.close()
+                        except:
+                            pass
+                logging.debug("db_read(single=False) -> %s", rows)
+                return _check_row_cap(rows) if capped else rows
+            except Exception as e:
+                if getattr(e, "errno", None) in _TIMEOUT_ERRNOS:
+                    _count("query_timeouts")
+                    raise QueryTimeout(str(e)) from e
+                raise
+            finally:
                 conn.close()
 
-        def db_write(sql, params=None):
+        # InnoDB hands out AUTO_INCREMENT values before commit, so without this
+        # a transaction could commit a smaller change_log.seq after a larger one
+        # was already read by /changes. Every write takes this row lock before
+        # its statement (and so before any trigger) and holds it until commit,
+        # which makes seq order equal commit order. Writes are rare here, so
+        # serializing all of them is cheaper than guessing which are tracked.
+        _CHANGE_LOCK_SQL = "SELECT id FROM change_log_lock WHERE id = 1 FOR UPDATE"
+
+        def _mysql_exec(cur, sql, params=None):
+            cur.execute(sql, params or ())
+            return cur
+
+        def db_write(sql, params=None, prepared=False):
             sql = _normalize_sql(sql)
             conn = get_conn()
             try:
                 cur = conn.cursor()
-                cur.execute(sql, params or ())
-                conn.commit()
+                if prepared:
+                    def execute(_cur, stmt, stmt_params=None):
+                        return _run_prepared(conn, stmt, stmt_params)
+                else:
+                    execute = _mysql_exec
+                # The pool runs in autocommit mode: the lock has to be held
+                # in the same transaction as the statement
+                conn.start_transaction()
+                try:
+                    _mysql_exec(cur, _CHANGE_LOCK_SQL).fetchall()
+                    execute(cur, sql, params)
+                    conn.commit()
+                except Exception:
+                    # No session reset on return to the pool, so roll back here
+                    conn.rollback()
+                    raise
                 logging.debug("db_write OK: %s %s", sql, params)
             finally:
                 try:
@@ -133,7 +575,8 @@ if USE_SQLITE:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 player_name TEXT,
                 player_firstname TEXT,
-                player_identifier TEXT
+                player_identifier TEXT,
+                search_key TEXT
             )
             """
         )
@@ -142,10 +585,17 @@ if USE_SQLITE:
             CREATE TABLE IF NOT EXISTS coaches (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 coach_name TEXT,
-                coach_firstname TEXT
+                coach_firstname TEXT,
+                search_key TEXT
             )
             """
         )
+        # Attempt to add search_key columns if they're missing (for existing dbs)
+        for table in ("players", "coaches"):
+            try:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN search_key TEXT")
+            except:
+                pass
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS coaches_per_club (
@@ -206,63 +656,168 @@ if USE_SQLITE:
             )
             """
         )
+        # Materialized club list (one row per club), maintained by club_summary.py
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS club_summary (
+                club_id INTEGER PRIMARY KEY,
+                club_name TEXT,
+                country TEXT,
+                player_count INTEGER NOT NULL DEFAULT 0,
+                title_count INTEGER NOT NULL DEFAULT 0,
+                last_title_year INTEGER,
+                coach_firstname TEXT,
+                coach_name TEXT
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_club_summary_name ON club_summary (club_name)")
+        # Trigram index over players/coaches search_key, maintained by search_index.py
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS name_trigrams (
+                kind TEXT NOT NULL,
+                trigram TEXT NOT NULL,
+                entity_id INTEGER NOT NULL,
+                PRIMARY KEY (kind, trigram, entity_id)
+            ) WITHOUT ROWID
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_name_trigrams_entity ON name_trigrams (kind, entity_id)")
+        # Posting list size per trigram, lets search_ids skip frequent trigrams
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trigram_stats (
+                kind TEXT NOT NULL,
+                trigram TEXT NOT NULL,
+                postings INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, trigram)
+            ) WITHOUT ROWID
+            """
+        )
+        # Append-only change log; AUTOINCREMENT guarantees seq is never reused
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                op TEXT NOT NULL,
+                row_id INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        def _columns(table):
+            return [r[1] for r in conn.execute(f"PRAGMA table_info({table})")]
+
+        def _stored(name):
+            row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)).fetchone()
+            return row[0] if row else None
+
+        _sync_change_log_triggers(cur, _columns, _stored, mysql=False)
         conn.commit()
         cur.close()
         conn.close()
 
     _ensure_schema()
 
+    # One persistent connection per thread (and per process, see fork note in
+    # the MySQL part) so sqlite3's per-connection statement cache is reused
+    _local = threading.local()
+
     def get_conn():
-        conn = sqlite3.connect(DB_FILE)
-        conn.row_factory = sqlite3.Row
+        conn = getattr(_local, "conn", None)
+        if conn is None or _local.pid != os.getpid():
+            conn = sqlite3.connect(DB_FILE, cached_statements=SQLITE_STATEMENT_CACHE)
+            conn.row_factory = sqlite3.Row
+            _local.conn = conn
+            _local.pid = os.getpid()
         return conn
 
     # Allow use of %s placeholders in code; convert to ? for sqlite
+    @functools.lru_cache(maxsize=SQL_CACHE_SIZE)
+    def _translate_sql(sql):
+        # normalize INSERT IGNORE for sqlite
+        return sql.replace("%s", "?").replace("INSERT IGNORE", "INSERT OR IGNORE")
+
     def _exec(cur, sql, params=None):
         if params:
-            sql = sql.replace("%s", "?")
-            # normalize INSERT IGNORE for sqlite
-            if USE_SQLITE:
-                sql = sql.replace("INSERT IGNORE", "INSERT OR IGNORE")
-            cur.execute(sql, params)
+            cur.execute(_translate_sql(sql), params)
         else:
-            sql = sql.replace("%s", "?")
-            if USE_SQLITE:
-                sql = sql.replace("INSERT IGNORE", "INSERT OR IGNORE")
-            cur.execute(sql)
+            cur.execute(_translate_sql(sql))
+        return cur
 
-    def db_read(sql, params=None, single=False):
+    # `prepared` only matters for MySQL; SQLite reuses statements via cached_statements
+    def db_read(sql, params=None, single=False, prepared=False, capped=False):
+        if capped:
+            sql = _cap_sql(sql, MAX_ROWS)
+        left = _time_left()
         conn = get_conn()
         try:
+            if left is not None:
+                # Abort the statement from inside SQLite's VM once the deadline passes
+                deadline = time.monotonic() + left
+                conn.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
             cur = conn.cursor()
-            _exec(cur, sql, params)
+            try:
+                _exec(cur, sql, params)
 
-            if single:
-                row = cur.fetchone()
-                logging.debug("db_read(single=True) -> %s", row)
-                return dict(row) if row else None
-            else:
-                rows = cur.fetchall()
-                rows = [dict(r) for r in rows]
-                logging.debug("db_read(single=False) -> %s", rows)
-                return rows
+                if single:
+                    row = cur.fetchone()
+                    logging.debug("db_read(single=True) -> %s", row)
+                    return dict(row) if row else None
+                else:
+                    rows = cur.fetchall()
+                    if capped:
+                        _check_row_cap(rows)
+                    rows = [dict(r) for r in rows]
+                    logging.debug("db_read(single=False) -> %s", rows)
+                    return rows
+            except sqlite3.OperationalError as e:
+                if left is not None and "interrupted" in str(e):
+                    _count("query_timeouts")
+                    raise QueryTimeout(str(e)) from e
+                raise
         finally:
             try:
                 cur.close()
             except:
                 pass
-            conn.close()
+            if left is not None:
+                # The connection is reused, so don't leave the handler behind
+                conn.set_progress_handler(None, 0)
 
-    def db_write(sql, params=None):
+    def db_write(sql, params=None, prepared=False):
         conn = get_conn()
         try:
             cur = conn.cursor()
-            _exec(cur, sql, params)
-            conn.commit()
+            try:
+                # change_log rows come from triggers in the same transaction;
+                # SQLite serializes writers, so seq follows commit order
+                _exec(cur, sql, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
             logging.debug("db_write OK: %s %s", sql, params)
         finally:
             try:
                 cur.close()
             except:
                 pass
-            conn.close()
\ No newline at end of file
+
+db_read = _timed(db_read)
+db_write = _timed(db_write)
+
+
+def db_stats():
+    """Counters for /metrics: timeouts, row cap, SQL translation and prepared statement caches."""
+    info = _translate_sql.cache_info()
+    stats = dict(METRICS)
+    stats.update({
+        "sql_cache_hits": info.hits,
+        "sql_cache_misses": info.misses,
+        "sql_cache_size": info.currsize,
+    })
+    return stats
@@ -8,13 +8,15 @@ CREATE TABLE players (
     id INT AUTO_INCREMENT PRIMARY KEY,
     player_name VARCHAR(250) NOT NULL,
     player_firstname VARCHAR(250) NOT NULL,
-    player_identifier VARCHAR(250) NOT NULL
+    player_identifier VARCHAR(250) NOT NULL,
+    search_key VARCHAR(500)
 );
 
 CREATE TABLE coaches (
     id INT AUTO_INCREMENT PRIMARY KEY,
     coach_name VARCHAR(250) NOT NULL,
-    coach_firstname VARCHAR(250) NOT NULL
+    coach_firstname VARCHAR(250) NOT NULL,
+    search_key VARCHAR(500)
 );
 
 CREATE TABLE coaches_per_club (
@@ -62,3 +64,53 @@ CREATE TABLE titles_per_club (
     FOREIGN KEY (title_id) REFERENCES titles(id),
     FOREIGN KEY (club_id) REFERENCES clubs(id)
 );
+
+-- Materialized club list: one row per club, kept up to date by club_summary.py
+CREATE TABLE club_summary (
+    club_id INT PRIMARY KEY,
+    club_name VARCHAR(250),
+    country VARCHAR(250),
+    player_count INT NOT NULL DEFAULT 0,
+    title_count INT NOT NULL DEFAULT 0,
+    last_title_year INT,
+    coach_firstname VARCHAR(250),
+    coach_name VARCHAR(250),
+    INDEX idx_club_summary_name (club_name)
+);
+
+-- Append-only change log (change data capture), filled by AFTER INSERT/UPDATE/
+-- DELETE triggers on the tracked tables; read via change_log.py. db.py creates
+-- the triggers at startup because they list the tables' current columns.
+CREATE TABLE change_log (
+    seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+    table_name VARCHAR(64) NOT NULL,
+    op VARCHAR(10) NOT NULL,
+    row_id INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Single row locked by every write so change_log.seq is assigned in
+-- commit order (see db.py, _CHANGE_LOCK_SQL)
+CREATE TABLE change_log_lock (
+    id INT PRIMARY KEY
+);
+INSERT INTO change_log_lock (id) VALUES (1);
+
+-- Trigram index over players/coaches search_key (casefolded, accent-free
+-- names), maintained by search_index.py
+CREATE TABLE name_trigrams (
+    kind VARCHAR(10) NOT NULL,
+    trigram VARCHAR(12) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    entity_id INT NOT NULL,
+    PRIMARY KEY (kind, trigram, entity_id),
+    INDEX idx_name_trigrams_entity (kind, entity_id)
+);
+
+-- Posting list size per trigram, maintained by search_index.py so queries
+-- can skip very frequent trigrams
+CREATE TABLE trigram_stats (
+    kind VARCHAR(10) NOT NULL,
+    trigram VARCHAR(12) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+    postings INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, trigram)
+);
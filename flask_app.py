@@ -1,4 +1,4 @@
-from flask import Flask, redirect, render_template, request, url_for, flash
+from flask import Flask, redirect, render_template, request, url_for, flash, jsonify
 import os
 try:
     from db import db_read, db_write, USE_SQLITE
@@ -6,22 +6,92 @@ except ImportError:
     from db import db_read, db_write
     USE_SQLITE = True # Fallback assumption
 
+from db import QueryTimeout, set_deadline, QUERY_TIMEOUT, db_stats
 from auth import login_manager, authenticate, register_user
+from profiling import init_profiling, is_admin_request, sample_rate, set_sample_rate, SETTINGS as PROFILE_SETTINGS
+from cache import cache
+from change_log import changes_since, last_seq, DEFAULT_BATCH
+from search_index import ensure_search_index, search_ids, search_key, index_name
+from club_summary import ensure_club_summary, club_changed
 from flask_login import login_user, logout_user, login_required, current_user
 import logging
 import uuid
+from collections import namedtuple
+from jinja2 import FileSystemBytecodeCache
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
 # Init flask app
 app = Flask(__name__)
-app.config["DEBUG"] = True
+# Dev server default; production entry points (wsgi.py) switch it off
+app.config["DEBUG"] = os.getenv("FLASK_DEBUG", "1") == "1"
 app.secret_key = "supersecret_local_key"
+# Seconds a request may spend in db reads before it gets a 503 (see db.py)
+app.config["QUERY_TIMEOUT"] = QUERY_TIMEOUT
+
+# Compiled templates are stored on disk and shared by all workers/restarts;
+# scripts/precompile_templates.py fills the cache at deploy time
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", os.path.join(os.path.dirname(__file__), ".jinja_cache"))
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
 
 # Init auth
 login_manager.init_app(app)
 login_manager.login_view = "login"
 
+# Init request profiling (sample rate / token via PROFILE_* env, see profiling.py)
+init_profiling(app)
+
+# Make sure the materialized club list exists for older databases
+try:
+    ensure_club_summary()
+except Exception as e:
+    logging.warning("club_summary check failed: %s", e)
+try:
+    ensure_search_index()
+except Exception as e:
+    logging.warning("search index check failed: %s", e)
+
+# Per-request db deadline, so one broad search cannot hold a worker/connection.
+# Only for reading requests: a form submit runs several writes and follow-up
+# reads, and aborting halfway would leave e.g. a player without a club link.
+@app.before_request
+def start_deadline():
+    if request.method in ("GET", "HEAD"):
+        set_deadline(app.config["QUERY_TIMEOUT"])
+    else:
+        set_deadline(None)
+
+@app.teardown_request
+def clear_deadline(exc=None):
+    set_deadline(None)
+
+@app.errorhandler(QueryTimeout)
+def query_timeout(e):
+    # The error page itself still needs the db (current_user), so lift the deadline
+    set_deadline(None)
+    logging.warning("Query aborted (%s): %s %s", e, request.path, request.query_string.decode(errors="replace"))
+    return render_template("error.html", message="Suche zu breit – bitte den Suchbegriff genauer eingeben."), 503
+
+@app.route("/metrics")
+@login_required
+def metrics():
+    return jsonify(db_stats())
+
+@app.route("/profiling", methods=["GET", "POST"])
+@login_required
+def profiling():
+    if not is_admin_request():
+        return jsonify({"error": "X-Profile-Token required"}), 403
+    if request.method == "POST":
+        if "sample_rate" not in request.values:
+            return jsonify({"error": "sample_rate is required"}), 400
+        try:
+            set_sample_rate(request.values["sample_rate"])
+        except ValueError:
+            return jsonify({"error": "sample_rate must be a number between 0 and 1"}), 400
+    return jsonify({**PROFILE_SETTINGS, "sample_rate": sample_rate()})
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     error = None
@@ -49,6 +119,30 @@ def logout():
     return redirect(url_for("index"))
 
 # === MAIN LIST / SEARCH ===
+# Result rows for main_page.html. Tuples are cheaper to build than dicts, and
+# links are built from a precomputed prefix instead of one url_for() per row.
+SearchResult = namedtuple("SearchResult", "id name details link")
+ClubResult = namedtuple("ClubResult", "id name details link player_count title_count last_title_year coach")
+
+def club_url_prefix():
+    # '/club/0' -> '/club/' (respects SCRIPT_NAME like url_for itself)
+    return url_for('club', club_id=0)[:-1]
+
+def club_result(c, prefix):
+    # Rows come from club_summary, so no extra joins are needed per club
+    club_id = c["club_id"]
+    first, last = c["coach_firstname"], c["coach_name"]
+    return ClubResult(
+        club_id,
+        c["club_name"],
+        c["country"] or "",
+        f"{prefix}{club_id}",
+        c["player_count"] or 0,
+        c["title_count"] or 0,
+        c["last_title_year"],
+        f"{first} {last}" if first and last else (first or last or ""),
+    )
+
 @app.route("/", methods=["GET"])
 @login_required
 def index():
@@ -56,19 +150,31 @@ def index():
     t = request.args.get("t", "club")
     
     # Statistics for Dashboard
+    failed = []
+
     def get_count(table):
         try:
             res = db_read(f"SELECT COUNT(*) as c FROM {table}", single=True)
             return res['c'] if res else 0
-        except:
+        except QueryTimeout:
+            # Out of time budget: let the 503 handler answer
+            raise
+        except Exception as e:
+            logging.warning("Count for %s failed: %s", table, e)
+            failed.append(table)
             return 0
 
-    stats = {
-        "clubs": get_count("clubs"),
-        "players": get_count("players"),
-        "trainers": get_count("coaches"),
-        "titles": get_count("titles")
-    }
+    stats = cache.get("stats")
+    if stats is None:
+        stats = {
+            "clubs": get_count("clubs"),
+            "players": get_count("players"),
+            "trainers": get_count("coaches"),
+            "titles": get_count("titles")
+        }
+        # Never cache placeholder zeros from failed counts
+        if not failed:
+            cache.set("stats", stats)
     
     if USE_SQLITE:
         # Only flash once per session ideally, but for now just show it if it's confusing the user
@@ -79,59 +185,64 @@ def index():
         # Actually, let's not spam the flash message. The Dashboard text is better.
 
     results = []
+    prefix = club_url_prefix()
 
     if not q:
         # Show all clubs sorted alphabetically
-        clubs = db_read("SELECT * FROM clubs ORDER BY club_name ASC")
-        for c in clubs:
-            results.append({
-                "id": c.get("id"),
-                "name": c.get("club_name") or c.get("name"),
-                "country": c.get("country"),
-                "details": f"{c.get('country', '')}",
-                "link": url_for('club', club_id=c.get("id"))
-            })
+        clubs = db_read("SELECT * FROM club_summary ORDER BY club_name ASC", prepared=True)
+        results = [club_result(c, prefix) for c in clubs]
     else:
         search_term = f"%{q}%"
         if t == "club":
-            filtered = db_read("SELECT * FROM clubs WHERE club_name LIKE %s OR country LIKE %s ORDER BY club_name ASC", (search_term, search_term))
-            for c in filtered:
-                results.append({
-                    "id": c.get("id"),
-                    "name": c.get("club_name"),
-                    "details": c.get("country"),
-                    "link": url_for('club', club_id=c.get("id"))
-                })
+            filtered = db_read("SELECT * FROM club_summary WHERE club_name LIKE %s OR country LIKE %s ORDER BY club_name ASC", (search_term, search_term), prepared=True, capped=True)
+            results = [club_result(c, prefix) for c in filtered]
         elif t == "player":
-            players = db_read("""
-                SELECT p.id, p.player_firstname, p.player_name, c.club_name, c.id as club_id 
-                FROM players p 
-                JOIN players_by_club pc ON p.id = pc.player_id 
-                JOIN clubs c ON pc.club_id = c.id
-                WHERE p.player_name LIKE %s OR p.player_firstname LIKE %s
-            """, (search_term, search_term))
-            for p in players:
-                results.append({
-                    "id": p.get("club_id"), # Link to club page
-                    "name": f"{p.get('player_firstname')} {p.get('player_name')}",
-                    "details": f"Spieler bei {p.get('club_name')}",
-                    "link": url_for('club', club_id=p.get('club_id'))
-                })
+            # Accent/typo tolerant: ids come ranked from the trigram index
+            ranked = search_ids("player", q)
+            players = []
+            if ranked:
+                placeholders = ", ".join(["%s"] * len(ranked))
+                players = db_read(f"""
+                    SELECT p.id, p.player_firstname, p.player_name, c.club_name, c.id as club_id 
+                    FROM players p 
+                    JOIN players_by_club pc ON p.id = pc.player_id 
+                    JOIN clubs c ON pc.club_id = c.id
+                    WHERE p.id IN ({placeholders})
+                """, tuple(i for i, _ in ranked), capped=True)
+                score = dict(ranked)
+                players.sort(key=lambda r: -score.get(r.get("id"), 0))
+            results = [
+                SearchResult(
+                    p["club_id"], # Link to club page
+                    f"{p['player_firstname']} {p['player_name']}",
+                    f"Spieler bei {p['club_name']}",
+                    f"{prefix}{p['club_id']}"
+                )
+                for p in players
+            ]
         elif t == "trainer":
-            coaches = db_read("""
-                SELECT c.id, c.coach_firstname, c.coach_name, cl.club_name, cl.id as club_id
-                FROM coaches c
-                JOIN coaches_per_club cc ON c.id = cc.coach_id
-                JOIN clubs cl ON cc.club_id = cl.id
-                WHERE c.coach_name LIKE %s OR c.coach_firstname LIKE %s
-            """, (search_term, search_term))
-            for c in coaches:
-                results.append({
-                    "id": c.get("club_id"),
-                    "name": f"{c.get('coach_firstname')} {c.get('coach_name')}",
-                    "details": f"Trainer bei {c.get('club_name')}",
-                    "link": url_for('club', club_id=c.get('club_id'))
-                })
+            ranked = search_ids("coach", q)
+            coaches = []
+            if ranked:
+                placeholders = ", ".join(["%s"] * len(ranked))
+                coaches = db_read(f"""
+                    SELECT c.id, c.coach_firstname, c.coach_name, cl.club_name, cl.id as club_id
+                    FROM coaches c
+                    JOIN coaches_per_club cc ON c.id = cc.coach_id
+                    JOIN clubs cl ON cc.club_id = cl.id
+                    WHERE c.id IN ({placeholders})
+                """, tuple(i for i, _ in ranked), capped=True)
+                score = dict(ranked)
+                coaches.sort(key=lambda r: -score.get(r.get("id"), 0))
+            results = [
+                SearchResult(
+                    c["club_id"],
+                    f"{c['coach_firstname']} {c['coach_name']}",
+                    f"Trainer bei {c['club_name']}",
+                    f"{prefix}{c['club_id']}"
+                )
+                for c in coaches
+            ]
         elif t == "title":
             titles = db_read("""
                 SELECT t.title_name, tp.year_, c.club_name, c.id as club_id
@@ -139,14 +250,16 @@ def index():
                 JOIN titles_per_club tp ON t.id = tp.title_id
                 JOIN clubs c ON tp.club_id = c.id
                 WHERE t.title_name LIKE %s
-            """, (search_term,))
-            for ti in titles:
-                results.append({
-                    "id": ti.get("club_id"),
-                    "name": ti.get("title_name"),
-                    "details": f"{ti.get('year_')} - {ti.get('club_name')}",
-                    "link": url_for('club', club_id=ti.get('club_id'))
-                })
+            """, (search_term,), prepared=True, capped=True)
+            results = [
+                SearchResult(
+                    ti["club_id"],
+                    ti["title_name"],
+                    f"{ti['year_']} - {ti['club_name']}",
+                    f"{prefix}{ti['club_id']}"
+                )
+                for ti in titles
+            ]
 
     return render_template("main_page.html", results=results, query=q, type=t, stats=stats, use_sqlite=USE_SQLITE)
 
@@ -154,7 +267,11 @@ def index():
 @app.route('/club/<int:club_id>')
 @login_required
 def club(club_id):
-    club = db_read("SELECT * FROM clubs WHERE id=%s", (club_id,), single=True)
+    page = cache.get(f"club:{club_id}")
+    if page is not None:
+        return render_template('club.html', **page)
+
+    club = db_read("SELECT * FROM clubs WHERE id=%s", (club_id,), single=True, prepared=True)
     if not club:
         return render_template('club.html', notfound=True)
     
@@ -167,23 +284,45 @@ def club(club_id):
         FROM players p 
         JOIN players_by_club pc ON p.id = pc.player_id 
         WHERE pc.club_id = %s
-    """, (club_id,))
+    """, (club_id,), prepared=True)
 
     trainers = db_read("""
         SELECT c.coach_firstname, c.coach_name, cc.start_year, cc.end_year
         FROM coaches c
         JOIN coaches_per_club cc ON c.id = cc.coach_id
         WHERE cc.club_id = %s
-    """, (club_id,))
+    """, (club_id,), prepared=True)
 
     titles = db_read("""
         SELECT t.title_name, tp.year_
         FROM titles t
         JOIN titles_per_club tp ON t.id = tp.title_id
         WHERE tp.club_id = %s ORDER BY tp.year_ DESC
-    """, (club_id,))
+    """, (club_id,), prepared=True)
+
+    page = {"club": club, "players": players, "trainers": trainers, "titles": titles}
+    cache.set(f"club:{club_id}", page)
+    return render_template('club.html', **page)
+
+# === CHANGE FEED ===
+@app.route("/changes")
+@login_required
+def changes():
+    # Incremental sync: /changes?since=<last seq seen>&limit=<batch size>
+    try:
+        since = int(request.args.get("since", 0))
+        limit = int(request.args.get("limit", DEFAULT_BATCH))
+    except ValueError:
+        return jsonify({"error": "since and limit must be integers"}), 400
 
-    return render_template('club.html', club=club, players=players, trainers=trainers, titles=titles)
+    rows = changes_since(since, limit)
+    for r in rows:
+        r["created_at"] = str(r.get("created_at")) if r.get("created_at") is not None else None
+    return jsonify({
+        "changes": rows,
+        "next_since": rows[-1]["seq"] if rows else since,
+        "last_seq": last_seq()
+    })
 
 # === CREATE ROUTES ===
 @app.route("/add_club", methods=["GET", "POST"])
@@ -196,11 +335,13 @@ def add_club():
         u_id = str(uuid.uuid4())
         
         try:
-            db_write("INSERT INTO clubs (club_name, country, stadium, uuid) VALUES (%s, %s, %s, %s)", (name, country, stadium, u_id))
+            db_write("INSERT INTO clubs (club_name, country, stadium, uuid) VALUES (%s, %s, %s, %s)", (name, country, stadium, u_id), prepared=True)
             
             # Retrieve the ID of the newly created club to redirect to it
-            new_club = db_read("SELECT id FROM clubs WHERE uuid=%s", (u_id,), single=True)
+            new_club = db_read("SELECT id FROM clubs WHERE uuid=%s", (u_id,), single=True, prepared=True)
             if new_club and new_club.get("id"):
+                club_changed(new_club.get("id"))
+                cache.delete("stats")
                 flash(f"Club '{name}' erfolgreich erstellt!", "success")
                 return redirect(url_for('club', club_id=new_club.get("id")))
             
@@ -220,15 +361,19 @@ def add_player():
         last = request.form["player_name"]
         club_id = request.form["club_id"]
         
-        db_write("INSERT INTO players (player_firstname, player_name, player_identifier) VALUES (%s, %s, %s)", (first, last, f"{first}_{last}".lower()))
-        player_row = db_read("SELECT id FROM players ORDER BY id DESC LIMIT 1", single=True)
+        key = search_key(first, last)
+        db_write("INSERT INTO players (player_firstname, player_name, player_identifier, search_key) VALUES (%s, %s, %s, %s)", (first, last, f"{first}_{last}".lower(), key), prepared=True)
+        player_row = db_read("SELECT id FROM players ORDER BY id DESC LIMIT 1", single=True, prepared=True)
         player_id = player_row['id'] if isinstance(player_row, dict) else player_row[0]
+        index_name("player", player_id, key)
         
-        db_write("INSERT INTO players_by_club (club_id, player_id) VALUES (%s, %s)", (club_id, player_id))
+        db_write("INSERT INTO players_by_club (club_id, player_id) VALUES (%s, %s)", (club_id, player_id), prepared=True)
+        club_changed(club_id)
+        cache.delete("stats", f"club:{club_id}")
         flash(f"Spieler {first} {last} wurde hinzugefügt.")
         return redirect(url_for('index'))
     
-    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC")
+    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC", prepared=True)
     return render_template("add_player.html", clubs=clubs)
 
 @app.route("/add_trainer", methods=["GET", "POST"])
@@ -241,15 +386,19 @@ def add_trainer():
         start = request.form["start_year"]
         end = request.form["end_year"]
 
-        db_write("INSERT INTO coaches (coach_firstname, coach_name) VALUES (%s, %s)", (first, last))
-        coach_row = db_read("SELECT id FROM coaches ORDER BY id DESC LIMIT 1", single=True)
+        key = search_key(first, last)
+        db_write("INSERT INTO coaches (coach_firstname, coach_name, search_key) VALUES (%s, %s, %s)", (first, last, key), prepared=True)
+        coach_row = db_read("SELECT id FROM coaches ORDER BY id DESC LIMIT 1", single=True, prepared=True)
         coach_id = coach_row['id'] if isinstance(coach_row, dict) else coach_row[0]
+        index_name("coach", coach_id, key)
 
-        db_write("INSERT INTO coaches_per_club (coach_id, club_id, start_year, end_year) VALUES (%s, %s, %s, %s)", (coach_id, club_id, start or None, end or None))
+        db_write("INSERT INTO coaches_per_club (coach_id, club_id, start_year, end_year) VALUES (%s, %s, %s, %s)", (coach_id, club_id, start or None, end or None), prepared=True)
+        club_changed(club_id)
+        cache.delete("stats", f"club:{club_id}")
         flash(f"Trainer {first} {last} wurde hinzugefügt.")
         return redirect(url_for('index'))
     
-    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC")
+    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC", prepared=True)
     return render_template("add_trainer.html", clubs=clubs)
 
 @app.route("/add_title", methods=["GET", "POST"])
@@ -260,15 +409,17 @@ def add_title():
         year = request.form["year_"]
         club_id = request.form["club_id"]
 
-        db_write("INSERT INTO titles (title_name) VALUES (%s)", (name,))
-        title_row = db_read("SELECT id FROM titles ORDER BY id DESC LIMIT 1", single=True)
+        db_write("INSERT INTO titles (title_name) VALUES (%s)", (name,), prepared=True)
+        title_row = db_read("SELECT id FROM titles ORDER BY id DESC LIMIT 1", single=True, prepared=True)
         title_id = title_row['id'] if isinstance(title_row, dict) else title_row[0]
         
-        db_write("INSERT INTO titles_per_club (title_id, club_id, year_) VALUES (%s, %s, %s)", (title_id, club_id, year))
+        db_write("INSERT INTO titles_per_club (title_id, club_id, year_) VALUES (%s, %s, %s)", (title_id, club_id, year), prepared=True)
+        club_changed(club_id)
+        cache.delete("stats", f"club:{club_id}")
         flash(f"Titel '{name}' hinzugefügt.")
         return redirect(url_for('index'))
     
-    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC")
+    clubs = db_read("SELECT id, club_name FROM clubs ORDER BY club_name ASC", prepared=True)
     return render_template("add_title.html", clubs=clubs)
 
 if __name__ == "__main__":
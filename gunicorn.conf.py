@@ -0,0 +1,13 @@
+# gunicorn settings, read from the environment:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+import os
+import multiprocessing
+
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", "2"))
+timeout = int(os.getenv("WEB_TIMEOUT", "30"))
+
+# Load the app once in the master so schema checks run once; db.py and
+# cache.py rebuild their connections in every forked worker.
+preload_app = True
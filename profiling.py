@@ -0,0 +1,140 @@
+import os
+import time
+import random
+import logging
+import cProfile
+import threading
+from flask import g, request, template_rendered, before_render_template
+from db import db_timer_start, db_timer_stop
+
+# Logger für dieses Modul
+logger = logging.getLogger(__name__)
+
+# Request profiling for slow pages in production.
+#
+# A sampled fraction of requests (PROFILE_SAMPLE_RATE), plus any request that
+# sends `X-Profile-Token: <PROFILE_TOKEN>`, runs under cProfile. The result is
+# written to PROFILE_DIR as a .prof file (pstats format: snakeviz, flameprof,
+# gprof2dot ...). Every request gets a Server-Timing header that splits its
+# time into db / template / python.
+#
+# The sample rate can be changed at runtime via POST /profiling (same token
+# header), so no restart is needed. It is stored in PROFILE_DIR/sample_rate so
+# every worker process picks it up; each worker re-checks the file's mtime at
+# most every RATE_CHECK_INTERVAL seconds.
+
+SETTINGS = {
+    "sample_rate": float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+    "dir": os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles")),
+}
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+RATE_FILE = os.path.join(SETTINGS["dir"], "sample_rate")
+RATE_CHECK_INTERVAL = 1.0
+
+# (next check time, mtime of RATE_FILE when last read)
+_rate_state = {"checked": 0.0, "mtime": None}
+
+# cProfile can only have one active profiler per process on newer Pythons
+_profile_lock = threading.Lock()
+
+
+def is_admin_request():
+    return bool(PROFILE_TOKEN) and request.headers.get("X-Profile-Token") == PROFILE_TOKEN
+
+
+def sample_rate():
+    """Current sample rate, reloaded from RATE_FILE when another worker changed it."""
+    now = time.monotonic()
+    if now < _rate_state["checked"]:
+        return SETTINGS["sample_rate"]
+    _rate_state["checked"] = now + RATE_CHECK_INTERVAL
+    try:
+        mtime = os.stat(RATE_FILE).st_mtime_ns
+        if mtime != _rate_state["mtime"]:
+            with open(RATE_FILE, encoding="utf-8") as fh:
+                SETTINGS["sample_rate"] = max(0.0, min(1.0, float(fh.read().strip())))
+            _rate_state["mtime"] = mtime
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError) as e:
+        logger.warning("Reading %s failed: %s", RATE_FILE, e)
+    return SETTINGS["sample_rate"]
+
+
+def set_sample_rate(rate):
+    rate = max(0.0, min(1.0, float(rate)))
+    os.makedirs(SETTINGS["dir"], exist_ok=True)
+    # Write + rename so other workers never read a half-written file
+    tmp = f"{RATE_FILE}.{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        fh.write(str(rate))
+    os.replace(tmp, RATE_FILE)
+    SETTINGS["sample_rate"] = rate
+    _rate_state["checked"] = 0.0
+    logger.info("Profiling sample rate set to %s", rate)
+
+
+def _start():
+    g.prof_start = time.perf_counter()
+    g.prof_template = 0.0
+    db_timer_start()
+
+    if (is_admin_request() or random.random() < sample_rate()) and _profile_lock.acquire(blocking=False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _before_template(sender, template, context, **extra):
+    g.prof_template_start = time.perf_counter()
+
+
+def _after_template(sender, template, context, **extra):
+    start = g.pop("prof_template_start", None)
+    # Templates rendered outside a request (scripts, benchmarks) have no timer
+    if start is not None and "prof_template" in g:
+        g.prof_template += time.perf_counter() - start
+
+
+def _finish(response):
+    start = g.pop("prof_start", None)
+    if start is None:
+        return response
+    total = time.perf_counter() - start
+    db_time = db_timer_stop()
+    template = g.pop("prof_template", 0.0)
+    python = max(0.0, total - db_time - template)
+    response.headers["Server-Timing"] = (
+        f"db;dur={db_time * 1000:.1f}, template;dur={template * 1000:.1f}, "
+        f"python;dur={python * 1000:.1f}, total;dur={total * 1000:.1f}"
+    )
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        try:
+            profiler.disable()
+            os.makedirs(SETTINGS["dir"], exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}_{request.endpoint or 'unknown'}_{total * 1000:.0f}ms"
+            profiler.dump_stats(os.path.join(SETTINGS["dir"], name + ".prof"))
+            with open(os.path.join(SETTINGS["dir"], "phases.log"), "a", encoding="utf-8") as fh:
+                fh.write(f"{name}\t{request.full_path}\tdb={db_time:.4f}\ttemplate={template:.4f}\tpython={python:.4f}\n")
+        except Exception as e:
+            logger.warning("Writing profile failed: %s", e)
+        finally:
+            _profile_lock.release()
+    return response
+
+
+def _cleanup(exc=None):
+    # after_request is skipped for unhandled errors; never leak the profiler lock
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+
+
+def init_profiling(app):
+    app.before_request(_start)
+    app.after_request(_finish)
+    app.teardown_request(_cleanup)
+    before_render_template.connect(_before_template, app)
+    template_rendered.connect(_after_template, app)
@@ -0,0 +1,92 @@
+"""Micro-benchmark: result shaping + rendering of main_page.html per 1k rows.
+
+Compares the old shaping (one dict and one url_for() per row) with the
+current one (namedtuples, links from a precomputed prefix), and template
+loading with and without the bytecode cache. No database needed.
+
+Usage:
+  python scripts/bench_render.py [rows] [repeats]
+"""
+import sys
+import os
+import time
+import tempfile
+
+# Fix imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template, url_for
+from jinja2 import FileSystemBytecodeCache
+from flask_app import app, club_result, club_url_prefix
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+REPEATS = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+rows = [
+    {
+        "club_id": i, "club_name": f"Club {i}", "country": "England",
+        "player_count": 25, "title_count": i % 7, "last_title_year": 2000 + i % 24,
+        "coach_firstname": "Pep", "coach_name": f"Coach {i}",
+    }
+    for i in range(1, ROWS + 1)
+]
+stats = {"clubs": ROWS, "players": 0, "trainers": 0, "titles": 0}
+
+
+def shape_dicts():
+    # Shaping as index() did it before: dict per row, url_for per row
+    results = []
+    for c in rows:
+        coach = " ".join(x for x in (c.get("coach_firstname"), c.get("coach_name")) if x)
+        results.append({
+            "id": c.get("club_id"),
+            "name": c.get("club_name"),
+            "country": c.get("country"),
+            "details": f"{c.get('country') or ''}",
+            "player_count": c.get("player_count") or 0,
+            "title_count": c.get("title_count") or 0,
+            "last_title_year": c.get("last_title_year"),
+            "coach": coach,
+            "link": url_for('club', club_id=c.get("club_id"))
+        })
+    return results
+
+
+def shape_tuples():
+    prefix = club_url_prefix()
+    return [club_result(c, prefix) for c in rows]
+
+
+def bench(label, shape):
+    shape_time = render_time = 0.0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        results = shape()
+        mid = time.perf_counter()
+        render_template("main_page.html", results=results, query="", type="club", stats=stats, use_sqlite=True)
+        shape_time += mid - start
+        render_time += time.perf_counter() - mid
+    per_1k = 1000.0 / ROWS / REPEATS * 1000
+    print(f"{label:<28} shaping {shape_time * per_1k:7.2f} ms/1k rows   render {render_time * per_1k:7.2f} ms/1k rows")
+
+
+def bench_load(label, bytecode_cache):
+    env = app.jinja_env.overlay(bytecode_cache=bytecode_cache, cache_size=0)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for name in ("base.html", "main_page.html", "club.html"):
+            env.get_template(name)
+    print(f"{label:<28} {(time.perf_counter() - start) / REPEATS * 1000:7.2f} ms per worker start")
+
+
+with app.test_request_context("/"):
+    render_template("main_page.html", results=[], query="", type="club", stats=stats, use_sqlite=True)
+    print(f"{ROWS} rows x {REPEATS} repeats")
+    bench("before (dict + url_for)", shape_dicts)
+    bench("after (namedtuple + prefix)", shape_tuples)
+
+    bench_load("templates, no bytecode cache", None)
+    with tempfile.TemporaryDirectory() as tmp:
+        bcc = FileSystemBytecodeCache(tmp)
+        app.jinja_env.overlay(bytecode_cache=bcc, cache_size=0).get_template("main_page.html")
+        bench_load("templates, bytecode cache", bcc)
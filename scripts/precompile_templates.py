@@ -0,0 +1,25 @@
+"""Compile all Jinja templates into the filesystem bytecode cache.
+
+Run at deploy time so no worker has to compile base.html, main_page.html,
+club.html ... on its first request. Cache dir: JINJA_CACHE_DIR (default
+`.jinja_cache` next to flask_app.py).
+
+Usage:
+  python scripts/precompile_templates.py
+"""
+import sys
+import os
+
+# Fix imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_app import app, JINJA_CACHE_DIR
+
+env = app.jinja_env
+names = env.list_templates(extensions=["html"])
+for name in names:
+    # get_template() compiles and stores the bytecode via env.bytecode_cache
+    env.get_template(name)
+    print(f"Compiled: {name}")
+
+print(f"{len(names)} templates compiled into {JINJA_CACHE_DIR}")
@@ -0,0 +1,20 @@
+"""Rebuild the materialized `club_summary` table from the base tables.
+
+Normally the add routes keep `club_summary` up to date; run this after
+bulk imports or manual edits in the database.
+
+Usage:
+  python scripts/rebuild_club_summary.py
+"""
+import sys
+import os
+
+# Fix imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from club_summary import rebuild_club_summary
+from db import db_read
+
+rebuild_club_summary()
+row = db_read("SELECT COUNT(*) as c FROM club_summary", single=True)
+print(f"club_summary rebuilt: {row['c'] if row else 0} clubs")
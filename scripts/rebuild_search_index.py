@@ -0,0 +1,20 @@
+"""Recompute player/coach search keys and the `name_trigrams` index.
+
+The add routes index new names on write; run this after bulk imports or
+after changing the normalization in search_index.py.
+
+Usage:
+  python scripts/rebuild_search_index.py
+"""
+import sys
+import os
+
+# Fix imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import rebuild_search_index
+from db import db_read
+
+rebuild_search_index()
+row = db_read("SELECT COUNT(*) as c FROM name_trigrams", single=True)
+print(f"Search index rebuilt: {row['c'] if row else 0} trigrams")
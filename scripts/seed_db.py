@@ -7,6 +7,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from flask_app import app
 from db import db_write, db_read, _ensure_schema
+from club_summary import rebuild_club_summary
+from search_index import rebuild_search_index
 
 print("Seeding database...")
 
@@ -98,4 +100,8 @@ with app.app_context():
         db_write("INSERT INTO titles_per_club (title_id, club_id, year_) VALUES (%s, %s, %s)", (ti_id, c_id, ti['year']))
         print(f"Added Title: {ti['title']} for {ti['club']}")
 
+    # Seed data is written directly, so refresh the materialized club list once
+    rebuild_club_summary()
+    rebuild_search_index()
+
 print("Seeding complete.")
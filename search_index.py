@@ -0,0 +1,231 @@
+import os
+import math
+import logging
+import unicodedata
+from db import db_read, db_write
+
+# Logger für dieses Modul
+logger = logging.getLogger(__name__)
+
+# Accent- and typo-tolerant name search for players and coaches.
+#
+# Every player/coach row carries a `search_key` (casefolded, accents stripped,
+# e.g. "Martin Ødegaard" -> "martin odegaard") that is computed on write.
+# `name_trigrams` is an inverted index from the trigrams of that key to the
+# row id, so a fuzzy lookup is a handful of primary-key range reads instead of
+# a LIKE scan over every name. `trigram_stats` holds the posting list size
+# per trigram.
+
+# Letters that NFKD does not decompose into base letter + accent
+_TRANSLITERATE = str.maketrans({
+    "ø": "o", "đ": "d", "ð": "d", "ł": "l", "ħ": "h", "ı": "i", "þ": "th",
+    "æ": "ae", "œ": "oe", "ß": "ss",
+})
+
+KINDS = {
+    "player": ("players", "player_firstname", "player_name"),
+    "coach": ("coaches", "coach_firstname", "coach_name"),
+}
+
+# Minimum share of the query's trigrams a name must contain to be a match
+MIN_SIMILARITY = 0.5
+MAX_CANDIDATES = 200
+# Upper bound for index postings read per query. Frequent trigrams ("  m",
+# "in ") have huge posting lists; `trigram_stats` keeps their sizes so a
+# query only reads the rarest trigrams it needs (see search_ids).
+MAX_SCAN_POSTINGS = int(os.getenv("SEARCH_MAX_SCAN_POSTINGS", "20000"))
+REBUILD_BATCH = 200
+
+
+def normalize(text):
+    """Casefold and strip accents: 'Jürgen Ødegaard' -> 'jurgen odegaard'."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.translate(_TRANSLITERATE)
+    # Treat punctuation like hyphens ("Heung-min") as word separators
+    text = "".join(ch if ch.isalnum() else " " for ch in text)
+    return " ".join(text.split())
+
+
+def search_key(firstname, name):
+    return normalize(f"{firstname or ''} {name or ''}")
+
+
+def trigrams(key):
+    """Set of padded word trigrams (same scheme as PostgreSQL pg_trgm)."""
+    grams = set()
+    for word in key.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def _placeholders(n):
+    return ", ".join(["%s"] * n)
+
+
+def _insert_trigrams(entries):
+    """Insert [(kind, entity_id, key)] into name_trigrams with one statement."""
+    params = []
+    for kind, entity_id, key in entries:
+        for g in sorted(trigrams(key)):
+            params.extend((kind, g, entity_id))
+    if params:
+        values = ", ".join(["(%s, %s, %s)"] * (len(params) // 3))
+        db_write(f"INSERT IGNORE INTO name_trigrams (kind, trigram, entity_id) VALUES {values}", tuple(params))
+
+
+def _adjust_stats(kind, grams, delta):
+    grams = sorted(grams)
+    if not grams:
+        return
+    if delta > 0:
+        values = ", ".join(["(%s, %s, 0)"] * len(grams))
+        params = []
+        for g in grams:
+            params.extend((kind, g))
+        db_write(f"INSERT IGNORE INTO trigram_stats (kind, trigram, postings) VALUES {values}", tuple(params))
+    db_write(
+        f"UPDATE trigram_stats SET postings = postings + %s WHERE kind = %s AND trigram IN ({_placeholders(len(grams))})",
+        (delta, kind, *grams)
+    )
+
+
+def index_name(kind, entity_id, key):
+    """(Re-)index one player/coach; call after writing its search_key."""
+    old = db_read(
+        "SELECT trigram FROM name_trigrams WHERE kind = %s AND entity_id = %s",
+        (kind, entity_id)
+    )
+    if old:
+        db_write("DELETE FROM name_trigrams WHERE kind = %s AND entity_id = %s", (kind, entity_id))
+        _adjust_stats(kind, {r.get("trigram") for r in old}, -1)
+    _insert_trigrams([(kind, entity_id, key)])
+    _adjust_stats(kind, trigrams(key), 1)
+
+
+def rebuild_search_index():
+    """Recompute all search keys, the trigram index and its stats.
+
+    Run via scripts/rebuild_search_index.py. search_key is derived from the
+    name columns; the change_log triggers ignore it (db.DERIVED_COLUMNS).
+    """
+    logger.info("rebuild_search_index(): baue Suchindex neu auf")
+    db_write("DELETE FROM name_trigrams")
+    db_write("DELETE FROM trigram_stats")
+    for kind, (table, first_col, last_col) in KINDS.items():
+        rows = db_read(f"SELECT id, {first_col}, {last_col}, search_key FROM {table}")
+        batch = []
+        for r in rows:
+            key = search_key(r.get(first_col), r.get(last_col))
+            if key != r.get("search_key"):
+                db_write(f"UPDATE {table} SET search_key = %s WHERE id = %s", (key, r.get("id")))
+            batch.append((kind, r.get("id"), key))
+            if len(batch) >= REBUILD_BATCH:
+                _insert_trigrams(batch)
+                batch = []
+        _insert_trigrams(batch)
+    db_write("""
+        INSERT INTO trigram_stats (kind, trigram, postings)
+        SELECT kind, trigram, COUNT(*) FROM name_trigrams GROUP BY kind, trigram
+    """)
+
+
+def ensure_search_index():
+    """Warn about rows written before search keys existed (no rebuild at startup).
+
+    Until scripts/rebuild_search_index.py has run, search_ids only finds
+    those rows by substring, without accent or typo tolerance.
+    """
+    for table, _, _ in KINDS.values():
+        row = db_read(f"SELECT COUNT(*) as c FROM {table} WHERE search_key IS NULL", single=True)
+        if row and row.get("c"):
+            logger.warning(
+                "ensure_search_index(): %s Zeilen in %s ohne search_key - "
+                "bitte scripts/rebuild_search_index.py ausführen", row.get("c"), table
+            )
+
+
+def _substring_ids(kind, query, key, limit):
+    """Ids whose name or search_key contains the query, like the old LIKE search.
+
+    Also covers rows written before search_key existed (NULL key, no trigrams).
+    """
+    table, first_col, last_col = KINDS[kind]
+    term = f"%{query}%"
+    rows = db_read(
+        f"SELECT id FROM {table} WHERE {last_col} LIKE %s OR {first_col} LIKE %s OR search_key LIKE %s LIMIT {int(limit)}",
+        (term, term, f"%{key}%")
+    )
+    return [r.get("id") for r in rows]
+
+
+def _trigram_ids(kind, grams, limit):
+    """[(entity_id, similarity)] for names sharing enough trigrams with the query."""
+    # Prefix filtering: a match contains at least `need` of the query's n
+    # trigrams, so it contains at least one of any n - need + 1 of them.
+    # Reading only the rarest n - need + 1 posting lists finds every match.
+    stats = db_read(
+        f"SELECT trigram, postings FROM trigram_stats WHERE kind = %s AND trigram IN ({_placeholders(len(grams))})",
+        (kind, *sorted(grams))
+    )
+    postings = {r.get("trigram"): r.get("postings") or 0 for r in stats}
+    need = math.ceil(MIN_SIMILARITY * len(grams))
+    rarest = sorted(grams, key=lambda g: postings.get(g, 0))[:len(grams) - need + 1]
+    rarest = [g for g in rarest if postings.get(g, 0) > 0]
+    if not rarest:
+        return []
+
+    scanned = sum(postings[g] for g in rarest)
+    if scanned > MAX_SCAN_POSTINGS:
+        # Even the rarest trigrams are too common: read a bounded slice of
+        # the rarest list instead of aggregating millions of postings
+        logger.info("search_ids(): %d Postings, begrenzt auf %d", scanned, MAX_SCAN_POSTINGS)
+        rows = db_read(
+            f"SELECT entity_id FROM name_trigrams WHERE kind = %s AND trigram = %s LIMIT {MAX_SCAN_POSTINGS}",
+            (kind, rarest[0])
+        )
+    else:
+        rows = db_read(
+            f"SELECT DISTINCT entity_id FROM name_trigrams WHERE kind = %s AND trigram IN ({_placeholders(len(rarest))})",
+            (kind, *rarest)
+        )
+    candidates = [r.get("entity_id") for r in rows]
+
+    # Exact score on the candidates: share of the query's trigrams found in
+    # the name, so single typos ("odgaard") still rank high
+    table = KINDS[kind][0]
+    results = []
+    for i in range(0, len(candidates), 1000):
+        chunk = candidates[i:i + 1000]
+        keys = db_read(
+            f"SELECT id, search_key FROM {table} WHERE id IN ({_placeholders(len(chunk))})",
+            tuple(chunk)
+        )
+        for r in keys:
+            score = len(grams & trigrams(r.get("search_key") or "")) / len(grams)
+            if score >= MIN_SIMILARITY:
+                results.append((r.get("id"), score))
+    results.sort(key=lambda x: -x[1])
+    return results[:limit]
+
+
+def search_ids(kind, query, limit=MAX_CANDIDATES):
+    """Return [(entity_id, similarity)] best first for a fuzzy name query.
+
+    Substring hits (score 1.0) come first, so mid-word fragments ("gaar")
+    match as before; trigram hits add accent- and typo-tolerant matches.
+    """
+    key = normalize(query)
+    if not key:
+        return []
+
+    scores = {entity_id: 1.0 for entity_id in _substring_ids(kind, query, key, limit)}
+    # Too short for trigrams to be selective
+    if len(key) >= 3:
+        for entity_id, score in _trigram_ids(kind, trigrams(key), limit):
+            scores.setdefault(entity_id, score)
+    return sorted(scores.items(), key=lambda x: -x[1])[:limit]
@@ -0,0 +1,17 @@
+"""Production entry point.
+
+PythonAnywhere: import `application` from this module in the WSGI file.
+Preforking server (pip install gunicorn):
+  gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers/threads are configured via WEB_WORKERS / WEB_THREADS (see
+gunicorn.conf.py). Set CACHE_BACKEND=sqlite so all workers share one cache.
+"""
+import os
+
+# Never run the debugger/reloader in production
+os.environ.setdefault("FLASK_DEBUG", "0")
+
+from flask_app import app
+
+application = app